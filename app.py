@@ -2,9 +2,11 @@
 
 import streamlit as st
 import faiss
-import pickle
+import numpy as np
+import pyarrow.feather as feather
 import requests
 import json
+import hashlib
 import os
 from dotenv import load_dotenv
 
@@ -13,70 +15,199 @@ load_dotenv()
 # Configuration
 VECTOR_DB_FOLDER = "vectorstore"
 FAISS_INDEX_FILE = os.path.join(VECTOR_DB_FOLDER, "faiss_index.idx")
-CHUNKS_FILE = os.path.join(VECTOR_DB_FOLDER, "chunks.pkl")
+CHUNKS_FILE = os.path.join(VECTOR_DB_FOLDER, "chunks.arrow")
 METADATA_FILE = os.path.join(VECTOR_DB_FOLDER, "metadata.json")
 
 # OpenRouter Configuration
 OPENROUTER_API_KEY = os.getenv("API_KEY")
 OPENROUTER_MODEL = "openai/gpt-oss-20b:free"  
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+MAX_CONTEXT_CHARS = 600  # per retrieved chunk sent to the LLM
+
+EXAMPLE_QUESTIONS = [
+    "How to deploy a Pod in Kubernetes?",
+    "Docker best practices for production",
+    "Kubernetes troubleshooting guide",
+    "Git branching strategies for DevOps",
+    "How to create ConfigMaps and Secrets?",
+    "CI/CD pipeline setup with GitHub Actions"
+]
 
 SYSTEM_PROMPT = """You are a helpful CloudOps Assistant specializing in Cloud & DevOps engineering. 
 You help engineers with Kubernetes, Docker, Cloud infrastructure, Git/Github, CI/CD, and DevOps best practices.
 
 Instructions:
-- Answer based on the provided context documents
+- Answer based on the provided context documents, using them as your primary source
+- Combine the context with your own knowledge of CloudOps best practices
 - Focus on practical, actionable advice
 - Include code examples when relevant
 - If context is insufficient, provide general CloudOps guidance
 - Keep responses clear and concise
 - Mention specific tools, commands, or configurations when applicable"""
 
+@st.cache_resource
+def load_metadata():
+    """Read index metadata once per process"""
+    with open(METADATA_FILE, 'r') as f:
+        return json.load(f)
+
+@st.cache_resource
+def get_gpu_resources():
+    """Allocate FAISS GPU scratch memory once per process"""
+    return faiss.StandardGpuResources()
+
+@st.cache_resource
+def load_faiss_index():
+    """Read the FAISS index once per process, on GPU 0 when one is available"""
+    index = faiss.read_index(FAISS_INDEX_FILE)
+    metadata = load_metadata()
+    if metadata.get('nprobe'):
+        index.nprobe = metadata['nprobe']
+    if metadata.get('ef_search'):
+        index.hnsw.efSearch = metadata['ef_search']
+    
+    # faiss-cpu builds have no GPU support, and HNSW indexes cannot be cloned to GPU
+    if hasattr(faiss, 'StandardGpuResources') and faiss.get_num_gpus() > 0:
+        try:
+            index = faiss.index_cpu_to_gpu(get_gpu_resources(), 0, index)
+        except Exception:
+            pass
+    return index
+
+@st.cache_resource
+def load_chunks():
+    """Memory-map the chunk table once per process"""
+    return feather.read_table(CHUNKS_FILE, memory_map=True)
+
+@st.cache_resource
+def load_keyword_index():
+    """Tokenize every chunk once into an inverted index (CSR postings by term id)"""
+    chunks = load_chunks()
+    vocab = {}
+    term_ids = []
+    chunk_ids = []
+    contents_lower = []
+    for chunk_idx, content in enumerate(chunks.column('content').to_pylist()):
+        content_lower = content.lower()
+        contents_lower.append(content_lower)
+        words = {vocab.setdefault(word, len(vocab)) for word in content_lower.split()}
+        term_ids.extend(words)
+        chunk_ids.extend([chunk_idx] * len(words))
+    
+    # Group chunk ids by term: postings[offsets[t]:offsets[t + 1]] are the chunks containing term t
+    term_ids = np.array(term_ids, dtype=np.int32)
+    order = np.argsort(term_ids, kind='stable')
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+    return {
+        'vocab': vocab,
+        'postings': np.array(chunk_ids, dtype=np.int32)[order],
+        'offsets': offsets,
+        'contents_lower': contents_lower
+    }
+
+def context_digest(context_chunks):
+    """Stable digest of the retrieved chunks, used as a cache key"""
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in context_chunks:
+        digest.update(chunk['source_file'].encode('utf-8') + b'\0')
+        digest.update(chunk['content'].encode('utf-8') + b'\0')
+    return digest.hexdigest()
+
+@st.cache_resource
+def get_http_session():
+    """Keep-alive session so repeated OpenRouter calls reuse one TLS connection"""
+    session = requests.Session()
+    session.headers.update({
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json"
+    })
+    return session
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def request_completion(query, context_key, _user_prompt):
+    """Call OpenRouter; only successful answers are cached, per (query, context)"""
+    data = {
+        "model": OPENROUTER_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": _user_prompt}
+        ],
+        "max_tokens": 1200,
+        "temperature": 0.1
+    }
+    
+    response = get_http_session().post(OPENROUTER_API_URL, json=data, timeout=30)
+    if response.status_code != 200:
+        raise requests.exceptions.HTTPError(response=response)
+    return response.json()['choices'][0]['message']['content']
+
 class CloudOpsAssistant:
     def __init__(self):
         self.index = None
         self.chunks = None
         self.metadata = None
+        self.keyword_index = None
         self._load_database()
     
     def _load_database(self):
-        """Load vector database silently"""
+        """Attach the cached vector database silently"""
         try:
             if all(os.path.exists(f) for f in [FAISS_INDEX_FILE, CHUNKS_FILE, METADATA_FILE]):
-                self.index = faiss.read_index(FAISS_INDEX_FILE)
-                with open(CHUNKS_FILE, 'rb') as f:
-                    self.chunks = pickle.load(f)
-                with open(METADATA_FILE, 'r') as f:
-                    self.metadata = json.load(f)
+                self.metadata = load_metadata()
+                self.index = load_faiss_index()
+                self.chunks = load_chunks()
+                self.keyword_index = load_keyword_index()
                 return True
             return False
         except:
             return False
     
     def search_knowledge_base(self, query, top_k=3):
-        """Search using keyword matching"""
+        """Search using vectorized keyword matching"""
         if not self.chunks:
             return []
         
         query_lower = query.lower()
         query_words = set(query_lower.split())
-        scored_chunks = []
+        vocab = self.keyword_index['vocab']
+        query_ids = [vocab[word] for word in query_words if word in vocab]
+        if not query_ids:
+            return []
         
-        for chunk in self.chunks:
-            content_lower = chunk['content'].lower()
-            content_words = set(content_lower.split())
-            common_words = query_words.intersection(content_words)
-            
-            if common_words:
-                score = len(common_words) / len(query_words) * (1 + content_lower.count(query_lower) * 0.1)
-                scored_chunks.append({
-                    'source_file': chunk['source_file'],
-                    'content': chunk['content'],
-                    'similarity_score': min(score, 1.0)
-                })
+        # Count shared words per chunk from the postings of the query terms only
+        postings = self.keyword_index['postings']
+        offsets = self.keyword_index['offsets']
+        hits = np.concatenate([postings[offsets[t]:offsets[t + 1]] for t in query_ids])
+        common_counts = np.bincount(hits, minlength=self.chunks.num_rows)
+        scores = common_counts / len(query_words)
         
-        scored_chunks.sort(key=lambda x: x['similarity_score'], reverse=True)
-        return scored_chunks[:top_k]
+        # The exact-phrase bonus can only matter for chunks not already at the 1.0 cap
+        contents_lower = self.keyword_index['contents_lower']
+        partial = np.flatnonzero((common_counts > 0) & (common_counts < len(query_words)))
+        phrase_counts = np.array([contents_lower[i].count(query_lower) for i in partial], dtype=np.float64)
+        scores[partial] *= 1 + phrase_counts * 0.1
+        scores = np.minimum(scores, 1.0)
+        
+        candidates = np.flatnonzero(common_counts)
+        if len(candidates) > top_k > 0:
+            # O(N) selection of the k-th best score; keep ties so ordering stays by chunk position
+            kth_score = -np.partition(-scores[candidates], top_k - 1)[top_k - 1]
+            candidates = candidates[scores[candidates] >= kth_score]
+        top = candidates[np.argsort(-scores[candidates], kind='stable')][:top_k]
+        top_rows = self.chunks.take(top)
+        return [
+            {
+                'source_file': source_file,
+                'content': content,
+                'similarity_score': score
+            }
+            for source_file, content, score in zip(
+                top_rows.column('source_file').to_pylist(),
+                top_rows.column('content').to_pylist(),
+                scores[top].tolist()
+            )
+        ]
     
     def generate_answer(self, query, context_chunks):
         """Generate comprehensive answer using OpenRouter API + Vectorstore"""
@@ -84,58 +215,36 @@ class CloudOpsAssistant:
             return "API key not configured. Please add API_KEY to your environment variables."
         
         try:
-            context_parts = []
+            # Instructions live in SYSTEM_PROMPT; the user turn carries only the question and context
             if context_chunks:
-                for chunk in context_chunks:
-                    context_parts.append(f"📄 {chunk['source_file']}:\n{chunk['content']}\n")
-                context = "\n".join(context_parts)
+                context = "\n---\n".join(
+                    f"[{chunk['source_file']}] {chunk['content'][:MAX_CONTEXT_CHARS]}" for chunk in context_chunks
+                )
             else:
-                context = "No direct matches found in vectorstore, but I'll provide general CloudOps guidance."
-            
-            user_prompt = f"""You are answering as a CloudOps Assistant using both your AI knowledge and the provided vectorstore context.
-
-VECTORSTORE CONTEXT:
-{context}
-
-CLOUDOPS QUESTION: {query}
-
-INSTRUCTIONS:
-1. Use the vectorstore context as your primary source when available
-2. Combine it with your AI knowledge of CloudOps best practices  
-3. Provide practical, actionable advice with code examples
-4. If vectorstore context is limited, supplement with your general CloudOps expertise
-5. Focus on Kubernetes, Docker, Cloud infrastructure, Git/GitHub, CI/CD, DevOps tools
-
-Please provide a comprehensive answer combining both sources:"""
+                context = "(no matching documents)"
             
-            headers = {
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
+            user_prompt = f"Question: {query}\n\nContext:\n{context}"
             
-            data = {
-                "model": OPENROUTER_MODEL,
-                "messages": [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "max_tokens": 1200,
-                "temperature": 0.1
-            }
-            
-            response = requests.post(OPENROUTER_API_URL, headers=headers, json=data, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result['choices'][0]['message']['content']
-            else:
-                return f"API request failed. Status code: {response.status_code}"
+            return request_completion(query, context_digest(context_chunks), user_prompt)
                 
+        except requests.exceptions.HTTPError as e:
+            return f"API request failed. Status code: {e.response.status_code}"
         except requests.exceptions.Timeout:
             return "Request timeout. Please try again."
         except Exception as e:
             return f"Error: {str(e)}"
 
+@st.cache_data(max_entries=1024, show_spinner=False)
+def cached_search(query, top_k=3):
+    """Memoize search results per (query, top_k)"""
+    return CloudOpsAssistant().search_knowledge_base(query, top_k=top_k)
+
+@st.cache_resource(show_spinner=False)
+def prewarm_example_searches():
+    """Fill the search cache for the example questions once per process"""
+    for question in EXAMPLE_QUESTIONS:
+        cached_search(question, top_k=3)
+
 def main():
     st.set_page_config(
         page_title="CloudOps Assistant",
@@ -152,9 +261,11 @@ def main():
         st.error("Vector database not found. Please ensure vectorstore files exist.")
         st.stop()
     
+    prewarm_example_searches()
+    
     query = st.text_area(
         "Ask your CloudOps question:",
-        placeholder="Examples:\n• How to deploy a Pod in Kubernetes?\n• Docker best practices for production\n• Kubernetes troubleshooting guide\n• Git branching strategies for DevOps\n• How to create ConfigMaps and Secrets?\n• CI/CD pipeline setup with GitHub Actions",
+        placeholder="Examples:\n" + "\n".join(f"• {question}" for question in EXAMPLE_QUESTIONS),
         height=240
     )
             
@@ -164,7 +275,7 @@ def main():
     if analyze_clicked:
         if query.strip():
             with st.spinner("Generating answer..."):
-                search_results = assistant.search_knowledge_base(query, top_k=3)
+                search_results = cached_search(query, top_k=3)
                 answer = assistant.generate_answer(query, search_results)
             
                 st.subheader("🤖 CloudOps Answer (AI + Vectorstore)")
@@ -1,117 +1,155 @@
 # #!/usr/bin/env python3
 
 # import os
+# import re
+# import mmap
+# import math
+# import bisect
 # import faiss
-# import pickle
-# from sentence_transformers import SentenceTransformer
+# import numpy as np
+# import pyarrow as pa
+# import pyarrow.feather as feather
+# from concurrent.futures import ProcessPoolExecutor
 # import json
 # from datetime import datetime
 
 # # Configuration
 # MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# # ONNX Runtime with the dynamically int8-quantized export (needs: pip install "sentence-transformers[onnx]")
+# MODEL_BACKEND = "onnx"
+# MODEL_FILE = "onnx/model_qint8_avx512_vnni.onnx"
 # DOCS_FOLDER = "docs"
 # OUTPUT_FOLDER = "vectorstore"
 
+# # Index settings
+# IVFPQ_MIN_VECTORS = 100000  # below this, an HNSW graph needs no training and fits in RAM comfortably
+# HNSW_M = 32  # graph neighbours per vector
+# HNSW_EF_CONSTRUCTION = 200
+# HNSW_EF_SEARCH = 64
+# PQ_M = 48  # sub-quantizers per vector (must divide the embedding dimension)
+# PQ_NBITS = 8
+# SQ_TYPE = "fp16"  # HNSW vector storage: "fp16" halves, "8bit" quarters float32 memory
+
 # # Output files
 # FAISS_INDEX_FILE = os.path.join(OUTPUT_FOLDER, "faiss_index.idx")
-# CHUNKS_FILE = os.path.join(OUTPUT_FOLDER, "chunks.pkl")
+# CHUNKS_FILE = os.path.join(OUTPUT_FOLDER, "chunks.arrow")
 # METADATA_FILE = os.path.join(OUTPUT_FOLDER, "metadata.json")
 
+# # Sentence boundaries a chunk may end on
+# _SENT_END = re.compile(rb'\.\s|\n\n|\n')
+
+# def chunk_document(data, chunk_size=800, overlap=150):
+#     """Yield overlapping chunks of a UTF-8 bytes-like document as bytes"""
+#     if len(data) <= chunk_size:
+#         yield data[:].strip()
+#         return
+    
+#     # Find every sentence boundary once, then binary-search it per chunk
+#     ends = [m.end() for m in _SENT_END.finditer(data)]
+#     start = 0
+    
+#     while start < len(data):
+#         end = min(start + chunk_size, len(data))
+        
+#         if end < len(data):
+#             # Try to end at the last sentence boundary in the back half of the window
+#             i = bisect.bisect_right(ends, end) - 1
+#             if i >= 0 and ends[i] > start + chunk_size // 2:
+#                 end = ends[i]
+#             else:
+#                 # Don't cut through a multi-byte character
+#                 while data[end] & 0xC0 == 0x80:
+#                     end -= 1
+        
+#         yield data[start:end].strip()
+#         start = max(end - overlap, end) if end < len(data) else end
+        
+#         if start >= len(data):
+#             break
+
+# def _chunk_file(filepath, chunk_size, overlap):
+#     """Memory-map one file and return its decoded chunks (runs in a worker process)"""
+#     with open(filepath, 'rb') as f:
+#         if os.fstat(f.fileno()).st_size == 0:
+#             return []
+#         # The mapping stays valid after the file is closed
+#         data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+#     with data:
+#         if not re.search(rb'\S', data):
+#             return []
+#         # Only the current chunk is copied out of the mapped file and decoded
+#         return [chunk.decode('utf-8') for chunk in chunk_document(data, chunk_size, overlap)]
+
 # class IndexBuilder:
 #     def __init__(self):
 #         print("🔧 Initializing Index Builder...")
-#         print(f"📥 Loading {MODEL_NAME}...")
-#         self.model = SentenceTransformer(MODEL_NAME)
+#         print(f"📥 Loading {MODEL_NAME} ({MODEL_BACKEND}: {MODEL_FILE})...")
+#         # Imported here so chunking worker processes don't pay for it
+#         from sentence_transformers import SentenceTransformer
+#         self.model = SentenceTransformer(
+#             MODEL_NAME,
+#             backend=MODEL_BACKEND,
+#             model_kwargs={"file_name": MODEL_FILE}
+#         )
 #         print("✅ Model loaded successfully!")
         
 #         # Create output directory
 #         os.makedirs(OUTPUT_FOLDER, exist_ok=True)
     
-#     def read_documents(self):
-#         """Read all documents from docs folder"""
+#     def read_documents(self, chunk_size=800, overlap=150):
+#         """Read and chunk all documents from docs folder in parallel"""
 #         if not os.path.exists(DOCS_FOLDER):
 #             print(f"❌ '{DOCS_FOLDER}' folder not found!")
 #             print(f"📁 Please create '{DOCS_FOLDER}' folder and add your documents (.md, .txt, .py files)")
 #             return [], []
         
+#         filenames = [f for f in os.listdir(DOCS_FOLDER) if f.endswith(('.md', '.txt', '.py', '.json', '.rst'))]
 #         documents = []
 #         sources = []
+#         if not filenames:
+#             print(f"📚 Loaded 0 documents")
+#             return documents, sources
         
-#         print(f"📖 Reading documents from '{DOCS_FOLDER}'...")
+#         print(f"📖 Reading and chunking documents from '{DOCS_FOLDER}' (size={chunk_size}, overlap={overlap})...")
         
-#         for filename in os.listdir(DOCS_FOLDER):
-#             if filename.endswith(('.md', '.txt', '.py', '.json', '.rst')):
-#                 filepath = os.path.join(DOCS_FOLDER, filename)
+#         # Each worker maps and chunks whole files; results are collected in directory order
+#         with ProcessPoolExecutor(max_workers=min(len(filenames), os.cpu_count() or 1)) as executor:
+#             futures = [
+#                 executor.submit(_chunk_file, os.path.join(DOCS_FOLDER, filename), chunk_size, overlap)
+#                 for filename in filenames
+#             ]
+#             for filename, future in zip(filenames, futures):
 #                 try:
-#                     with open(filepath, 'r', encoding='utf-8') as f:
-#                         content = f.read().strip()
-#                         if content:
-#                             documents.append(content)
-#                             sources.append(filename)
-#                             print(f"  ✓ {filename} ({len(content)} chars)")
+#                     chunks = future.result()
+#                     if chunks:
+#                         documents.append(chunks)
+#                         sources.append(filename)
+#                         print(f"  ✓ {filename}: {len(chunks)} chunks")
 #                 except Exception as e:
 #                     print(f"  ❌ Error reading {filename}: {e}")
         
 #         print(f"📚 Loaded {len(documents)} documents")
 #         return documents, sources
     
-#     def chunk_document(self, text, chunk_size=800, overlap=150):
-#         """Split document into overlapping chunks"""
-#         if len(text) <= chunk_size:
-#             return [text]
-        
-#         chunks = []
-#         start = 0
-        
-#         while start < len(text):
-#             end = min(start + chunk_size, len(text))
-#             chunk = text[start:end]
-            
-#             # Try to end at sentence boundary
-#             if end < len(text):
-#                 # Look for sentence endings
-#                 for delimiter in ['. ', '\n\n', '\n', '. ']:
-#                     last_delim = chunk.rfind(delimiter)
-#                     if last_delim > start + chunk_size // 2:
-#                         chunk = text[start:start + last_delim + len(delimiter)]
-#                         end = start + last_delim + len(delimiter)
-#                         break
-            
-#             chunks.append(chunk.strip())
-#             start = max(end - overlap, end) if end < len(text) else end
-            
-#             if start >= len(text):
-#                 break
-                
-#         return chunks
-    
 #     def build_index(self, chunk_size=800, overlap=150):
 #         """Build the complete FAISS index"""
         
-#         # Read documents
-#         documents, sources = self.read_documents()
+#         # Read and chunk documents
+#         documents, sources = self.read_documents(chunk_size, overlap)
 #         if not documents:
 #             return False
         
-#         print(f"\n🔪 Chunking documents (size={chunk_size}, overlap={overlap})...")
-        
+#         # Chunk data is kept as parallel columns, one entry per chunk
 #         all_chunks = []
-#         chunk_metadata = []
-        
-#         for doc_idx, (document, source) in enumerate(zip(documents, sources)):
-#             chunks = self.chunk_document(document, chunk_size, overlap)
-#             print(f"  📄 {source}: {len(chunks)} chunks")
-            
-#             for chunk_idx, chunk in enumerate(chunks):
-#                 all_chunks.append(chunk)
-#                 chunk_metadata.append({
-#                     'source_file': source,
-#                     'doc_index': doc_idx,
-#                     'chunk_index': chunk_idx,
-#                     'chunk_id': f"{source}_chunk_{chunk_idx + 1}",
-#                     'content': chunk,
-#                     'char_count': len(chunk)
-#                 })
+#         chunk_sources = []
+#         doc_indices = []
+#         chunk_indices = []
+        
+#         for doc_idx, (chunks, source) in enumerate(zip(documents, sources)):
+#             all_chunks.extend(chunks)
+#             chunk_sources.extend([source] * len(chunks))
+#             doc_indices.extend([doc_idx] * len(chunks))
+#             chunk_indices.extend(range(len(chunks)))
         
 #         total_chunks = len(all_chunks)
 #         print(f"📊 Total chunks created: {total_chunks}")
@@ -124,22 +162,61 @@
 #         print(f"\n🧮 Generating embeddings...")
 #         print("This may take a few minutes for large document sets...")
         
-#         embeddings = self.model.encode(
-#             all_chunks, 
-#             batch_size=32,
+#         # Encode each distinct chunk text once; duplicates share its embedding
+#         unique_ids = {}
+#         inverse = np.array([unique_ids.setdefault(chunk, len(unique_ids)) for chunk in all_chunks])
+#         unique_chunks = list(unique_ids)
+#         if len(unique_chunks) < total_chunks:
+#             print(f"  ♻️ Skipping {total_chunks - len(unique_chunks)} duplicate chunks")
+        
+#         # Encode in token-length order so each batch pads to a similar length
+#         lengths = [len(self.model.tokenizer.tokenize(chunk)) for chunk in unique_chunks]
+#         order = np.argsort(lengths)
+#         sorted_chunks = [unique_chunks[i] for i in order]
+        
+#         sorted_embeddings = self.model.encode(
+#             sorted_chunks, 
+#             batch_size=64,
 #             show_progress_bar=True,
-#             convert_to_numpy=True
+#             convert_to_numpy=True,
+#             # Unit-length vectors make inner product equal to cosine similarity
+#             normalize_embeddings=True
 #         )
         
+#         # Restore the original chunk order (duplicates included) to stay aligned with the chunk columns
+#         embeddings = sorted_embeddings[np.argsort(order)[inverse]]
+        
 #         print(f"✅ Generated {len(embeddings)} embeddings (dim: {embeddings.shape[1]})")
         
 #         # Create FAISS index
 #         print(f"🔍 Building FAISS index...")
 #         dimension = embeddings.shape[1]
-#         index = faiss.IndexFlatL2(dimension)
         
-#         # Convert to float32 (FAISS requirement)
-#         embeddings = embeddings.astype('float32')
+#         # FAISS needs C-contiguous float32; encode output already is, so this doesn't copy
+#         embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        
+#         nprobe = None
+#         ef_search = None
+#         if total_chunks < IVFPQ_MIN_VECTORS:
+#             quantizer_type = SQ_TYPE
+#             qtype = faiss.ScalarQuantizer.QT_fp16 if SQ_TYPE == "fp16" else faiss.ScalarQuantizer.QT_8bit
+#             # Graph search over scalar-quantized vectors: logarithmic query time instead of a full scan
+#             index = faiss.IndexHNSWSQ(dimension, qtype, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+#             index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+#             index.train(embeddings)
+#             ef_search = HNSW_EF_SEARCH
+#             index.hnsw.efSearch = ef_search
+#         else:
+#             quantizer_type = f"pq{PQ_M}x{PQ_NBITS}"
+#             # Cluster into nlist cells and product-quantize residuals to PQ_M bytes per vector
+#             nlist = int(4 * math.sqrt(total_chunks))
+#             quantizer = faiss.IndexFlatIP(dimension)
+#             index = faiss.IndexIVFPQ(quantizer, dimension, nlist, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+#             print(f"  🏋️ Training IVFPQ (nlist={nlist}, M={PQ_M}, nbits={PQ_NBITS})...")
+#             index.train(embeddings)
+#             nprobe = max(1, nlist // 32)
+#             index.nprobe = nprobe
+        
 #         index.add(embeddings)
         
 #         # Save everything
@@ -150,20 +227,33 @@
 #         print(f"  ✓ FAISS index: {FAISS_INDEX_FILE}")
         
 #         # Save chunk data
-#         with open(CHUNKS_FILE, 'wb') as f:
-#             pickle.dump(chunk_metadata, f)
+#         chunk_table = pa.table({
+#             'source_file': pa.array(chunk_sources, type=pa.string()),
+#             'content': pa.array(all_chunks, type=pa.string()),
+#             'doc_index': pa.array(doc_indices, type=pa.int32()),
+#             'chunk_index': pa.array(chunk_indices, type=pa.int32())
+#         })
+#         # Uncompressed so the app can memory-map the columns without copying
+#         feather.write_feather(chunk_table, CHUNKS_FILE, compression='uncompressed')
 #         print(f"  ✓ Chunks data: {CHUNKS_FILE}")
         
 #         # Save metadata
 #         metadata = {
 #             'created_at': datetime.now().isoformat(),
 #             'model_name': MODEL_NAME,
+#             'model_backend': MODEL_BACKEND,
+#             'model_file': MODEL_FILE,
 #             'total_documents': len(documents),
 #             'total_chunks': total_chunks,
 #             'embedding_dimension': dimension,
 #             'chunk_size': chunk_size,
 #             'chunk_overlap': overlap,
 #             'source_files': sources,
+#             'index_type': type(index).__name__,
+#             'metric': 'ip',
+#             'quantizer': quantizer_type,
+#             'nprobe': nprobe,
+#             'ef_search': ef_search,
 #             'index_stats': {
 #                 'ntotal': index.ntotal,
 #                 'dimension': index.d